@@ -0,0 +1,27 @@
+import argparse
+import os
+from app import crud
+from app.database import SessionLocal
+
+# Paid bills older than this many days are moved to the archive table
+BILL_ARCHIVE_AGE_DAYS = int(os.getenv("BILL_ARCHIVE_AGE_DAYS", "365"))
+
+
+def main():
+    """Archive settled bills from a scheduler: python -m app.archive [--older-than-days N] [--chunk-size N]"""
+    parser = argparse.ArgumentParser(description="Move paid bills past a given age into bills_archive")
+    parser.add_argument("--older-than-days", type=int, default=BILL_ARCHIVE_AGE_DAYS)
+    parser.add_argument("--chunk-size", type=int, default=1000)
+    args = parser.parse_args()
+    if args.older_than_days < 0 or args.chunk_size < 1:
+        parser.error("--older-than-days must be >= 0 and --chunk-size >= 1")
+    db = SessionLocal()
+    try:
+        archived = crud.archive_bills(db, older_than_days=args.older_than_days, chunk_size=args.chunk_size)
+    finally:
+        db.close()
+    print(f"Archived {archived} bill(s) older than {args.older_than_days} days")
+
+
+if __name__ == "__main__":
+    main()
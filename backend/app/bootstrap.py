@@ -0,0 +1,97 @@
+from sqlalchemy import inspect
+from sqlalchemy.schema import CreateIndex, CreateTable
+from app import crud, models, schemas
+from app.database import engine, SessionLocal, Base
+
+
+# Create default admin
+def create_admin():
+    db = SessionLocal()
+    if not crud.get_user_by_username(db, "admin"):
+        admin = schemas.UserCreate(
+            username="admin",
+            password="admin123",
+            role="admin"
+        )
+        crud.create_user(db, admin)
+    db.close()
+
+
+def add_missing_columns():
+    """Add model columns missing from tables created by an older version, and
+    stamp existing rows with an updated_at so incremental exports see them."""
+    inspector = inspect(engine)
+    with engine.begin() as conn:
+        for table in Base.metadata.sorted_tables:
+            existing = {column["name"] for column in inspector.get_columns(table.name)}
+            for column in table.columns:
+                if column.name not in existing:
+                    column_type = column.type.compile(dialect=engine.dialect)
+                    conn.exec_driver_sql(f"ALTER TABLE {table.name} ADD COLUMN {column.name} {column_type}")
+            if "updated_at" in table.columns:
+                conn.execute(
+                    table.update()
+                    .where(table.c.updated_at.is_(None))
+                    .values(updated_at=models.utcnow())
+                )
+
+
+def migrate_bill_ids():
+    """Rebuild a bills table created without AUTOINCREMENT and keep its id
+    sequence above every archived bill id."""
+    with engine.connect() as conn:
+        sql = conn.exec_driver_sql(
+            "SELECT sql FROM sqlite_master WHERE type = 'table' AND name = 'bills'"
+        ).scalar()
+        columns = ", ".join(row[1] for row in conn.exec_driver_sql("PRAGMA table_info(bills)"))
+    if "AUTOINCREMENT" not in sql.upper():
+        table = models.Bill.__table__
+        statements = ["BEGIN", "ALTER TABLE bills RENAME TO bills_old"]
+        statements += [f"DROP INDEX IF EXISTS {index.name}" for index in table.indexes]
+        statements.append(str(CreateTable(table).compile(dialect=engine.dialect)))
+        statements += [str(CreateIndex(index).compile(dialect=engine.dialect)) for index in table.indexes]
+        statements += [
+            f"INSERT INTO bills ({columns}) SELECT {columns} FROM bills_old",
+            "DROP TABLE bills_old",
+            "COMMIT",
+        ]
+        # pysqlite commits DDL implicitly, so run the rebuild as one explicit transaction
+        raw = engine.raw_connection()
+        try:
+            raw.driver_connection.executescript(";\n".join(statements))
+        except Exception:
+            raw.driver_connection.rollback()
+            raise
+        finally:
+            raw.close()
+    with engine.begin() as conn:
+        top_id = conn.exec_driver_sql(
+            "SELECT MAX(id) FROM (SELECT MAX(bill_id) AS id FROM bills"
+            " UNION ALL SELECT MAX(bill_id) FROM bills_archive)"
+        ).scalar() or 0
+        updated = conn.exec_driver_sql(
+            "UPDATE sqlite_sequence SET seq = MAX(seq, ?) WHERE name = 'bills'", (top_id,)
+        ).rowcount
+        if not updated:
+            conn.exec_driver_sql("INSERT INTO sqlite_sequence (name, seq) VALUES ('bills', ?)", (top_id,))
+
+
+def bootstrap():
+    """Create tables and the default admin; run once before serving."""
+    Base.metadata.create_all(bind=engine)
+    add_missing_columns()
+    if engine.dialect.name == "sqlite":
+        # WAL lets worker processes read while another one writes
+        with engine.connect() as conn:
+            conn.exec_driver_sql("PRAGMA journal_mode=WAL")
+        migrate_bill_ids()
+    # create_all skips tables that already exist, so add indexes added to the models since
+    for table in Base.metadata.sorted_tables:
+        for index in table.indexes:
+            index.create(bind=engine, checkfirst=True)
+    create_admin()
+    engine.dispose()
+
+
+if __name__ == "__main__":
+    bootstrap()
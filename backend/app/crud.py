@@ -1,5 +1,10 @@
+from sqlalchemy import DateTime, func, insert, literal, select, update
 from sqlalchemy.orm import Session
 from app import models, schemas
+from datetime import date, timedelta
+from itertools import islice
+import csv
+import math
 from passlib.context import CryptContext
 
 pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
@@ -30,6 +35,7 @@ def get_customer(db: Session, customer_id: int):
 def delete_customer(db: Session, customer_id: int):
     # First delete all bills associated with this customer
     db.query(models.Bill).filter(models.Bill.customer_id == customer_id).delete()
+    db.query(models.ArchivedBill).filter(models.ArchivedBill.customer_id == customer_id).delete()
     
     # Then delete the customer
     customer = db.query(models.Customer).filter(models.Customer.customer_id == customer_id).first()
@@ -58,21 +64,31 @@ def create_bill(db: Session, bill: schemas.BillCreate):
     db.refresh(db_bill)
     return db_bill
 
-def get_bills(db: Session, skip: int = 0, limit: int = 100):
-    return db.query(models.Bill).offset(skip).limit(limit).all()
-
-def get_bill(db: Session, bill_id: int):
-    return db.query(models.Bill).filter(models.Bill.bill_id == bill_id).first()
+def get_bills(db: Session, skip: int = 0, limit: int = 100, include_archived: bool = False):
+    bills = db.query(models.Bill).offset(skip).limit(limit).all()
+    if include_archived and len(bills) < limit:
+        # Archived bills are paged after all live ones
+        live_count = db.query(func.count(models.Bill.bill_id)).scalar()
+        bills += db.query(models.ArchivedBill).offset(max(skip - live_count, 0)).limit(limit - len(bills)).all()
+    return bills
+
+def get_bill(db: Session, bill_id: int, include_archived: bool = True):
+    bill = db.query(models.Bill).filter(models.Bill.bill_id == bill_id).first()
+    if not bill and include_archived:
+        # Fall back to the archive so old bill ids keep resolving
+        bill = db.query(models.ArchivedBill).filter(models.ArchivedBill.bill_id == bill_id).first()
+    return bill
 
+# Archived bills are read-only, so changes only look at live bills
 def delete_bill(db: Session, bill_id: int):
-    bill = get_bill(db, bill_id)
+    bill = get_bill(db, bill_id, include_archived=False)
     if bill:
         db.delete(bill)
         db.commit()
     return bill
 
 def update_bill(db: Session, bill_id: int, bill_update: schemas.BillUpdate):
-    bill = get_bill(db, bill_id)
+    bill = get_bill(db, bill_id, include_archived=False)
     if not bill:
         return None
     update_data = bill_update.dict(exclude_unset=True)
@@ -82,6 +98,137 @@ def update_bill(db: Session, bill_id: int, bill_update: schemas.BillUpdate):
     db.refresh(bill)
     return bill
 
+def archive_bills(db: Session, older_than_days: int = 365, chunk_size: int = 1000):
+    """Move paid bills older than older_than_days into bills_archive, one chunk per transaction."""
+    cutoff = date.today() - timedelta(days=older_than_days)
+    columns = [column.name for column in models.Bill.__table__.columns]
+    archived = 0
+    while True:
+        # Archived rows get a fresh updated_at per chunk so incremental exports pick up the move
+        values = [
+            literal(models.utcnow(), DateTime).label(column.name) if column.name == "updated_at" else column
+            for column in models.Bill.__table__.columns
+        ]
+        ids = [row.bill_id for row in db.query(models.Bill.bill_id).filter(
+            models.Bill.status == schemas.BillStatus.PAID.value,
+            models.Bill.billing_date < cutoff
+        ).limit(chunk_size)]
+        if not ids:
+            break
+        db.execute(insert(models.ArchivedBill).from_select(
+            columns,
+            select(*values).where(models.Bill.bill_id.in_(ids))
+        ))
+        db.query(models.Bill).filter(models.Bill.bill_id.in_(ids)).delete(synchronize_session=False)
+        db.commit()
+        archived += len(ids)
+    return archived
+
+OPEN_BILL_STATUSES = [schemas.BillStatus.UNPAID.value, schemas.BillStatus.OVERDUE.value]
+
+def _parse_payment(line: int, row: dict):
+    bill_id = row.get("bill_id") or None
+    customer_id = row.get("customer_id") or None
+    payment = schemas.ReconciliationLine(
+        line=line,
+        bill_id=int(bill_id) if bill_id else None,
+        customer_id=int(customer_id) if customer_id else None,
+        amount=float(row["amount"]),
+        detail=""
+    )
+    payment.paid_on = date.fromisoformat(row["date"])
+    if not math.isfinite(payment.amount) or payment.amount <= 0:
+        raise ValueError("amount must be a positive number")
+    if payment.bill_id is None and payment.customer_id is None:
+        raise ValueError("bill_id or customer_id is required")
+    return payment
+
+def reconcile_payments(db: Session, rows, chunk_size: int = 5000):
+    """Mark open bills paid from payment rows with bill_id or customer_id, amount and date.
+
+    Rows are processed chunk_size at a time: open bills for the chunk are
+    looked up with two IN queries and settled with a single UPDATE per chunk.
+    A payment without a bill_id settles the customer's oldest open bill.
+    Overpayments settle the bill and are also listed in report.overpaid.
+    Raises ValueError if the file cannot be read; chunks before that stay committed.
+    """
+    report = schemas.ReconciliationReport(matched=0, partial=[], overpaid=[], unmatched=[], chunks_committed=0)
+    rows = enumerate(rows, start=2)  # line 1 is the CSV header
+    while True:
+        try:
+            chunk = list(islice(rows, chunk_size))
+        except (UnicodeDecodeError, csv.Error) as e:
+            raise ValueError(
+                f"Unreadable payment file after {report.chunks_committed} committed chunk(s) "
+                f"of {chunk_size} rows: {e}"
+            )
+        if not chunk:
+            break
+        payments = []
+        for line, row in chunk:
+            try:
+                payments.append(_parse_payment(line, row))
+            except (KeyError, TypeError, ValueError):
+                report.unmatched.append(schemas.ReconciliationLine(line=line, detail="Invalid row"))
+
+        bill_ids = {p.bill_id for p in payments if p.bill_id is not None}
+        customer_ids = {p.customer_id for p in payments if p.bill_id is None}
+        open_bills = {}
+        if bill_ids:
+            open_bills.update((b.bill_id, b) for b in db.execute(
+                select(models.Bill.bill_id, models.Bill.customer_id, models.Bill.amount).where(
+                    models.Bill.bill_id.in_(bill_ids),
+                    models.Bill.status.in_(OPEN_BILL_STATUSES)
+                )
+            ))
+        customer_bills = {}
+        if customer_ids:
+            for b in db.execute(
+                select(models.Bill.bill_id, models.Bill.customer_id, models.Bill.amount).where(
+                    models.Bill.customer_id.in_(customer_ids),
+                    models.Bill.status.in_(OPEN_BILL_STATUSES)
+                ).order_by(models.Bill.customer_id, models.Bill.due_date, models.Bill.bill_id)
+            ):
+                customer_bills.setdefault(b.customer_id, []).append(b)
+
+        settled = set()
+        for payment in payments:
+            if payment.bill_id is not None:
+                bill = open_bills.get(payment.bill_id)
+            else:
+                # Oldest open bill of the customer not already settled in this chunk
+                bill = next((b for b in customer_bills.get(payment.customer_id, []) if b.bill_id not in settled), None)
+            if bill is None or bill.bill_id in settled:
+                payment.detail = "No open bill"
+                report.unmatched.append(payment)
+            elif payment.customer_id is not None and payment.customer_id != bill.customer_id:
+                payment.detail = f"Bill belongs to customer {bill.customer_id}"
+                report.unmatched.append(payment)
+            elif payment.amount < bill.amount:
+                payment.bill_id = bill.bill_id
+                payment.detail = f"Paid {payment.amount} of {bill.amount}"
+                report.partial.append(payment)
+            else:
+                settled.add(bill.bill_id)
+                report.matched += 1
+                if payment.amount > bill.amount:
+                    # Settled, but the excess needs follow-up
+                    payment.bill_id = bill.bill_id
+                    payment.detail = f"Overpaid by {round(payment.amount - bill.amount, 2)}"
+                    report.overpaid.append(payment)
+
+        if settled:
+            db.execute(
+                update(models.Bill)
+                .where(models.Bill.bill_id.in_(settled))
+                .values(status=schemas.BillStatus.PAID.value, updated_at=models.utcnow())
+            )
+        db.commit()
+        report.chunks_committed += 1
+    # Invalid rows are collected before lookup failures within a chunk
+    report.unmatched.sort(key=lambda line: line.line)
+    return report
+
 # User CRUD
 def get_user_by_username(db: Session, username: str):
     return db.query(models.User).filter(models.User.username == username).first()
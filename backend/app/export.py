@@ -0,0 +1,85 @@
+import os
+import tempfile
+import pyarrow as pa
+import pyarrow.parquet as pq
+from datetime import datetime, timedelta
+from typing import Optional
+from sqlalchemy import Boolean, Date, DateTime, Float, Integer, String, select
+from sqlalchemy.orm import Session
+from app.models import utcnow
+
+# Arrow types for the SQLAlchemy column types used in models.py
+ARROW_TYPES = {
+    Integer: pa.int64(),
+    Float: pa.float64(),
+    String: pa.string(),
+    Date: pa.date32(),
+    DateTime: pa.timestamp("us"),
+    Boolean: pa.bool_(),
+}
+
+# Rows are stamped before their transaction takes the SQLite write lock, so one
+# committed after a snapshot can carry an earlier updated_at than rows it saw.
+# The returned watermark lags the snapshot start by this much to cover that gap.
+WATERMARK_LAG = timedelta(seconds=float(os.getenv("EXPORT_WATERMARK_LAG", "60")))
+
+FORMATS = {
+    "arrow": (".arrows", "application/vnd.apache.arrow.stream"),
+    "parquet": (".parquet", "application/vnd.apache.parquet"),
+}
+
+
+def arrow_schema(model):
+    return pa.schema([
+        pa.field(column.name, ARROW_TYPES[type(column.type)])
+        for column in model.__table__.columns
+    ])
+
+
+def _record_batches(db: Session, model, schema, since: Optional[datetime], batch_size: int):
+    # Stream rows changed after since from the cursor, oldest change first, one record batch per partition
+    table = model.__table__
+    query = select(*table.columns).order_by(table.c.updated_at, *table.primary_key.columns)
+    if since is not None:
+        query = query.where(table.c.updated_at > since)
+    result = db.execute(query).yield_per(batch_size)
+    for rows in result.partitions():
+        columns = list(zip(*rows))
+        yield pa.RecordBatch.from_arrays(
+            [pa.array(values, type=field.type) for values, field in zip(columns, schema)],
+            schema=schema
+        )
+
+
+def write_snapshot(db: Session, models: list, fmt: str = "parquet", since: Optional[datetime] = None, batch_size: int = 10000):
+    """Write rows of models changed after since (all rows if None) to a temporary file.
+
+    Returns the file path and a watermark WATERMARK_LAG before the snapshot
+    started, which the caller passes back as since for the next incremental
+    snapshot. Consecutive snapshots overlap, so clients de-duplicate by
+    primary key, keeping the row with the latest updated_at. Deleted rows do
+    not appear in incremental snapshots.
+    """
+    suffix, _ = FORMATS[fmt]
+    schema = arrow_schema(models[0])
+    watermark = utcnow() - WATERMARK_LAG
+    if since is not None:
+        watermark = max(watermark, since)
+    fd, path = tempfile.mkstemp(suffix=suffix)
+    os.close(fd)
+    try:
+        if fmt == "parquet":
+            writer = pq.ParquetWriter(path, schema)
+        else:
+            writer = pa.ipc.new_stream(path, schema)
+        try:
+            for model in models:
+                for batch in _record_batches(db, model, schema, since, batch_size):
+                    writer.write_batch(batch)
+        finally:
+            writer.close()
+    except Exception:
+        # The caller only removes the file after a successful response
+        os.remove(path)
+        raise
+    return path, watermark
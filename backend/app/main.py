@@ -1,12 +1,21 @@
-from fastapi import FastAPI, Depends, HTTPException, status
+from fastapi import FastAPI, Depends, HTTPException, Request, UploadFile, status
+from fastapi.responses import FileResponse, JSONResponse
+from starlette.background import BackgroundTask
 from fastapi.security import OAuth2PasswordBearer, OAuth2PasswordRequestForm
+from sqlalchemy import text
 from sqlalchemy.orm import Session
-from app import models, schemas, crud
-from app.database import engine, SessionLocal, Base
+from app import models, schemas, crud, archive, export, ratelimit
+from app.database import SessionLocal
+from app.bootstrap import bootstrap
 from passlib.context import CryptContext
-from datetime import timedelta
-
-Base.metadata.create_all(bind=engine)
+from datetime import datetime, timedelta, timezone
+from typing import Optional
+import codecs
+import csv
+import math
+import os
+import signal
+import threading
 
 app = FastAPI()
 
@@ -14,6 +23,10 @@ app = FastAPI()
 pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
 oauth2_scheme = OAuth2PasswordBearer(tokenUrl="token")
 
+# Seconds /readyz reports 503 after SIGTERM before the server stops accepting requests
+DRAIN_DELAY = float(os.getenv("DRAIN_DELAY", "10"))
+draining = threading.Event()
+
 # Dependency
 def get_db():
     db = SessionLocal()
@@ -22,22 +35,50 @@ def get_db():
     finally:
         db.close()
 
-# Create default admin on startup
+# Create tables and default admin on startup, unless app.serve already did it
 @app.on_event("startup")
-def create_admin():
-    db = SessionLocal()
-    if not crud.get_user_by_username(db, "admin"):
-        admin = schemas.UserCreate(
-            username="admin",
-            password="admin123",
-            role="admin"
-        )
-        crud.create_user(db, admin)
-    db.close()
+def startup():
+    if os.getenv("APP_BOOTSTRAPPED") != "1":
+        bootstrap()
+
+# Wrap uvicorn's SIGTERM handler so the worker first reports not-ready for DRAIN_DELAY
+# seconds, giving load balancers time to stop routing to it, and only then shuts down
+@app.on_event("startup")
+def install_drain_handler():
+    if threading.current_thread() is not threading.main_thread():
+        return
+    shutdown = signal.getsignal(signal.SIGTERM)
+    if not callable(shutdown):
+        return
 
+    def drain(signum, frame):
+        if draining.is_set():
+            # A second SIGTERM skips the rest of the delay
+            shutdown(signum, frame)
+            return
+        draining.set()
+        timer = threading.Timer(DRAIN_DELAY, shutdown, args=(signum, frame))
+        timer.daemon = True
+        timer.start()
 
+    signal.signal(signal.SIGTERM, drain)
+
+
+
+# Shed load before the threadpool and database saturate; probes are always answered
+@app.middleware("http")
+async def limit_concurrency(request: Request, call_next):
+    if request.url.path in ("/healthz", "/readyz"):
+        return await call_next(request)
+    if not ratelimit.concurrency.try_acquire():
+        return JSONResponse(status_code=503, content={"detail": "Server busy"}, headers={"Retry-After": "1"})
+    try:
+        return await call_next(request)
+    finally:
+        ratelimit.concurrency.release()
 
-def get_current_user(db: Session = Depends(get_db), token: str = Depends(oauth2_scheme)):
+
+def get_current_user(request: Request, db: Session = Depends(get_db), token: str = Depends(oauth2_scheme)):
     user = crud.get_user_by_username(db, username=token)
     if not user:
         raise HTTPException(
@@ -45,9 +86,50 @@ def get_current_user(db: Session = Depends(get_db), token: str = Depends(oauth2_
             detail="Invalid authentication credentials",
             headers={"WWW-Authenticate": "Bearer"},
         )
+    # Rate limit per user, and per route for routes listed in RATE_LIMIT_ROUTES
+    route = request.scope.get("route")
+    wait = ratelimit.limiter.acquire(user.username, f"{request.method} {route.path if route else request.url.path}")
+    if wait:
+        raise HTTPException(
+            status_code=status.HTTP_429_TOO_MANY_REQUESTS,
+            detail="Rate limit exceeded",
+            headers={"Retry-After": str(math.ceil(wait))},
+        )
     return user
 
 
+# Probes
+@app.get("/healthz")
+def healthz():
+    # Liveness: the process is up and serving requests
+    return {"status": "ok"}
+
+@app.get("/readyz")
+def readyz(db: Session = Depends(get_db)):
+    # Readiness: not draining and the database is reachable
+    if draining.is_set():
+        raise HTTPException(status_code=503, detail="Draining")
+    try:
+        db.execute(text("SELECT 1"))
+    except Exception:
+        raise HTTPException(status_code=503, detail="Database unavailable")
+    return {"status": "ready"}
+
+@app.get("/metrics/ratelimit")
+def ratelimit_metrics(current_user: schemas.User = Depends(get_current_user)):
+    # Counters are per worker process; pid tells which worker answered
+    if current_user.role != "admin":
+        raise HTTPException(status_code=403, detail="Only admin can view metrics")
+    return {
+        "pid": os.getpid(),
+        "in_flight": ratelimit.concurrency.active,
+        "rejected": [
+            {"reason": reason, "route": route, "count": count}
+            for (reason, route), count in ratelimit.metrics.items()
+        ]
+    }
+
+
 # Bills
 @app.post("/bills/", response_model=schemas.Bill)
 def create_bill(bill: schemas.BillCreate, db: Session = Depends(get_db)):
@@ -57,11 +139,12 @@ def create_bill(bill: schemas.BillCreate, db: Session = Depends(get_db)):
 def read_bills(
     skip: int = 0,
     limit: int = 100,
+    include_archived: bool = False,
     db: Session = Depends(get_db),
     current_user: schemas.User = Depends(get_current_user)
 ):
     # Allow both admin and operator to view bills
-    return crud.get_bills(db, skip=skip, limit=limit)
+    return crud.get_bills(db, skip=skip, limit=limit, include_archived=include_archived)
 
 @app.get("/bills/{bill_id}", response_model=schemas.Bill)
 def read_bill(
@@ -78,7 +161,10 @@ def read_bill(
 
 @app.delete("/bills/{bill_id}", response_model=schemas.Bill)
 def delete_bill(bill_id: int, db: Session = Depends(get_db)):
-    return crud.delete_bill(db, bill_id)
+    db_bill = crud.delete_bill(db, bill_id)
+    if not db_bill and crud.get_bill(db, bill_id):
+        raise HTTPException(status_code=409, detail="Archived bills cannot be changed")
+    return db_bill
 
 @app.put("/bills/{bill_id}", response_model=schemas.Bill)
 def update_bill(
@@ -91,9 +177,46 @@ def update_bill(
         raise HTTPException(status_code=403, detail="Only admin can update")
     db_bill = crud.update_bill(db, bill_id, bill_update)
     if not db_bill:
+        if crud.get_bill(db, bill_id):
+            raise HTTPException(status_code=409, detail="Archived bills cannot be changed")
         raise HTTPException(status_code=404, detail="Bill not found")
     return db_bill
 
+@app.post("/bills/archive", response_model=schemas.ArchiveResult)
+def archive_bills(
+    older_than_days: int = archive.BILL_ARCHIVE_AGE_DAYS,
+    chunk_size: int = 1000,
+    db: Session = Depends(get_db),
+    current_user: schemas.User = Depends(get_current_user)
+):
+    if current_user.role != "admin":
+        raise HTTPException(status_code=403, detail="Only admin can archive bills")
+    if older_than_days < 0 or chunk_size < 1:
+        raise HTTPException(status_code=400, detail="Invalid archive parameters")
+    archived = crud.archive_bills(db, older_than_days=older_than_days, chunk_size=chunk_size)
+    return {"archived": archived, "older_than_days": older_than_days}
+
+@app.post("/bills/reconcile", response_model=schemas.ReconciliationReport)
+def reconcile_payments(
+    file: UploadFile,
+    db: Session = Depends(get_db),
+    current_user: schemas.User = Depends(get_current_user)
+):
+    # CSV with a header of bill_id, customer_id, amount, date; bill_id or customer_id may be blank
+    if current_user.role != "admin":
+        raise HTTPException(status_code=403, detail="Only admin can reconcile payments")
+    rows = csv.DictReader(codecs.iterdecode(file.file, "utf-8-sig"))
+    try:
+        fieldnames = rows.fieldnames
+    except (UnicodeDecodeError, csv.Error) as e:
+        raise HTTPException(status_code=400, detail=f"Unreadable payment file: {e}")
+    if not fieldnames or "amount" not in fieldnames or "date" not in fieldnames:
+        raise HTTPException(status_code=400, detail="CSV must have amount and date columns")
+    try:
+        return crud.reconcile_payments(db, rows)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
 @app.get("/users/me", response_model=schemas.User)
 def read_current_user(
     current_user: schemas.User = Depends(get_current_user),
@@ -202,6 +325,39 @@ def update_customer(
         raise HTTPException(status_code=404, detail="Customer not found")
     return db_customer
 
+# Analytics exports
+@app.get("/export/{table}")
+def export_snapshot(
+    table: str,
+    format: str = "parquet",
+    since: Optional[datetime] = None,
+    include_archived: bool = True,
+    db: Session = Depends(get_db),
+    current_user: schemas.User = Depends(get_current_user)
+):
+    # Snapshot of rows changed after since (all rows if omitted); pass X-Snapshot-Since back for the next one.
+    # Consecutive snapshots overlap; de-duplicate rows by primary key
+    if format not in export.FORMATS:
+        raise HTTPException(status_code=400, detail="Format must be 'arrow' or 'parquet'")
+    if since is not None and since.tzinfo is not None:
+        # updated_at is stored as naive UTC
+        since = since.astimezone(timezone.utc).replace(tzinfo=None)
+    if table == "bills":
+        tables = [models.Bill, models.ArchivedBill] if include_archived else [models.Bill]
+    elif table == "customers":
+        tables = [models.Customer]
+    else:
+        raise HTTPException(status_code=404, detail="Unknown export table")
+    path, watermark = export.write_snapshot(db, tables, fmt=format, since=since)
+    suffix, media_type = export.FORMATS[format]
+    return FileResponse(
+        path,
+        media_type=media_type,
+        filename=f"{table}{suffix}",
+        headers={"X-Snapshot-Since": watermark.isoformat()},
+        background=BackgroundTask(os.remove, path)
+    )
+
 # User Management
 @app.post("/users/", response_model=schemas.User)
 def create_user(
@@ -1,5 +1,10 @@
-from sqlalchemy import Column, Integer, String, Float, Date, ForeignKey, Boolean
+from sqlalchemy import Column, Integer, String, Float, Date, DateTime, ForeignKey, Boolean
 from app.database import Base
+from datetime import datetime, timezone
+
+def utcnow():
+    # Naive UTC with microseconds, so snapshot watermarks order correctly
+    return datetime.now(timezone.utc).replace(tzinfo=None)
 
 class Customer(Base):
     __tablename__ = "customers"
@@ -8,15 +13,30 @@ class Customer(Base):
     phone_number = Column(String(15), unique=True)
     email = Column(String(100))
     address = Column(String(200))
+    updated_at = Column(DateTime, default=utcnow, onupdate=utcnow, index=True)
 
 class Bill(Base):
     __tablename__ = "bills"
+    # AUTOINCREMENT so ids of archived bills are never handed out again
+    __table_args__ = {"sqlite_autoincrement": True}
+    bill_id = Column(Integer, primary_key=True, index=True)
+    customer_id = Column(Integer, ForeignKey("customers.customer_id"), index=True)
+    billing_date = Column(Date)
+    due_date = Column(Date)
+    amount = Column(Float)
+    status = Column(String(20))
+    updated_at = Column(DateTime, default=utcnow, onupdate=utcnow, index=True)
+
+class ArchivedBill(Base):
+    # Settled bills moved out of the hot table by crud.archive_bills
+    __tablename__ = "bills_archive"
     bill_id = Column(Integer, primary_key=True, index=True)
-    customer_id = Column(Integer, ForeignKey("customers.customer_id"))
+    customer_id = Column(Integer, ForeignKey("customers.customer_id"), index=True)
     billing_date = Column(Date)
     due_date = Column(Date)
     amount = Column(Float)
     status = Column(String(20))
+    updated_at = Column(DateTime, default=utcnow, onupdate=utcnow, index=True)
 
 class User(Base):
     __tablename__ = "users"
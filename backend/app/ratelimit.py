@@ -0,0 +1,115 @@
+import os
+import threading
+import time
+from collections import Counter
+from app.database import DB_MAX_OVERFLOW, DB_POOL_SIZE
+
+
+def _parse_limit(value: str):
+    # "rate:burst" in requests per second, e.g. "5:10"
+    rate, burst = (float(part) for part in value.split(":"))
+    if not (rate > 0 and burst >= 1):
+        raise ValueError(f"Invalid rate limit {value!r}: rate must be > 0 and burst >= 1")
+    return rate, burst
+
+
+def _parse_route_limits(value: str):
+    # "GET /bills/=2:5;POST /bills/reconcile=0.1:1"
+    limits = {}
+    for item in filter(None, value.split(";")):
+        route, limit = item.rsplit("=", 1)
+        limits[route.strip()] = _parse_limit(limit)
+    return limits
+
+
+# Buckets and counters live in each worker process, so limits apply per worker.
+# A keep-alive client stays on one worker and gets the full configured rate;
+# one spread over N workers can get up to N times that.
+USER_LIMIT = _parse_limit(os.getenv("RATE_LIMIT_USER", "20:40"))
+ROUTE_LIMITS = _parse_route_limits(os.getenv(
+    "RATE_LIMIT_ROUTES",
+    "GET /bills/=5:10;GET /export/{table}=0.2:2;POST /bills/reconcile=0.1:1;POST /bills/archive=0.1:1"
+))
+# Nearly every route holds a DB connection, so shed requests before they would
+# queue on the pool (and time out there) instead of once the threadpool is full
+MAX_CONCURRENCY = int(os.getenv("MAX_CONCURRENCY", DB_POOL_SIZE + DB_MAX_OVERFLOW))
+
+
+class TokenBucket:
+    __slots__ = ("rate", "burst", "tokens", "updated")
+
+    def __init__(self, rate: float, burst: float, now: float):
+        self.rate = rate
+        self.burst = burst
+        self.tokens = self.burst
+        self.updated = now
+
+    def refill(self, now: float):
+        self.tokens = min(self.burst, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def wait_time(self):
+        # Seconds until one token is available
+        return 0.0 if self.tokens >= 1 else (1 - self.tokens) / self.rate
+
+
+class RateLimiter:
+    """Per-user and per-route token buckets, sharded by username so requests
+    from different users rarely contend on the same lock."""
+
+    def __init__(self, user_limit=USER_LIMIT, route_limits=ROUTE_LIMITS, shards: int = 16):
+        self.user_limit = user_limit
+        self.route_limits = route_limits
+        self.shards = [({}, threading.Lock()) for _ in range(shards)]
+
+    def _bucket(self, buckets: dict, key, limit, now: float):
+        bucket = buckets.get(key)
+        if bucket is None:
+            bucket = buckets[key] = TokenBucket(*limit, now)
+        return bucket
+
+    def acquire(self, user: str, route: str):
+        """Take a token from the user's buckets; return 0 if allowed, else seconds to wait."""
+        buckets, lock = self.shards[hash(user) % len(self.shards)]
+        now = time.monotonic()
+        with lock:
+            needed = [self._bucket(buckets, user, self.user_limit, now)]
+            if route in self.route_limits:
+                needed.append(self._bucket(buckets, (user, route), self.route_limits[route], now))
+            for bucket in needed:
+                bucket.refill(now)
+            wait = max(bucket.wait_time() for bucket in needed)
+            if wait == 0:
+                for bucket in needed:
+                    bucket.tokens -= 1
+        if wait:
+            with metrics_lock:
+                metrics["throttled", route] += 1
+        return wait
+
+
+class ConcurrencyLimiter:
+    """Counts in-flight requests; used from the event loop, so no lock is needed."""
+
+    def __init__(self, limit: int = MAX_CONCURRENCY):
+        self.limit = limit
+        self.active = 0
+
+    def try_acquire(self):
+        if self.active >= self.limit:
+            with metrics_lock:
+                metrics["shed", "*"] += 1
+            return False
+        self.active += 1
+        return True
+
+    def release(self):
+        self.active -= 1
+
+
+# (reason, route) -> count of rejected requests in this worker
+metrics = Counter()
+metrics_lock = threading.Lock()
+
+limiter = RateLimiter()
+concurrency = ConcurrencyLimiter()
@@ -73,6 +73,25 @@ class BillUpdate(BaseModel):
     amount: Optional[float] = Field(None, gt=0)
     status: Optional[BillStatus] = None
 
+class ArchiveResult(BaseModel):
+    archived: int
+    older_than_days: int
+
+class ReconciliationLine(BaseModel):
+    line: int
+    bill_id: Optional[int] = None
+    customer_id: Optional[int] = None
+    amount: Optional[float] = None
+    paid_on: Optional[date] = None
+    detail: str
+
+class ReconciliationReport(BaseModel):
+    matched: int
+    partial: list[ReconciliationLine]
+    overpaid: list[ReconciliationLine]
+    unmatched: list[ReconciliationLine]
+    chunks_committed: int
+
 class UserCreate(BaseModel):
     username: str
     password: str
@@ -0,0 +1,22 @@
+import os
+import uvicorn
+from app.bootstrap import bootstrap
+
+
+def main():
+    # Bootstrap once here so workers don't race on create_all and the admin insert
+    bootstrap()
+    os.environ["APP_BOOTSTRAPPED"] = "1"
+    workers = int(os.getenv("WEB_CONCURRENCY", os.cpu_count() or 1))
+    uvicorn.run(
+        "app.main:app",
+        host=os.getenv("HOST", "0.0.0.0"),
+        port=int(os.getenv("PORT", "8000")),
+        workers=workers,
+        # Seconds to let in-flight requests finish once draining (DRAIN_DELAY in app.main) ends
+        timeout_graceful_shutdown=int(os.getenv("GRACEFUL_TIMEOUT", "30")),
+    )
+
+
+if __name__ == "__main__":
+    main()